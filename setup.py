@@ -37,9 +37,12 @@ install_requires = [
   # Server dependecies
   'fastapi',
   'uvicorn',
+  'orjson',
+  'msgspec',
 
   'xvfbwrapper==0.2.9 ; platform_system != "Windows"',
   'gunicorn ; platform_system != "Windows"',
+  'uvloop ; platform_system != "Windows"',
 ]
 
 for package_import_name, package in [('numpy', 'numpy'), ('cv2', 'opencv-python')]:
@@ -3,17 +3,18 @@ import sys
 import re
 import typing
 import typing_extensions
-import datetime
-import copy
+import time
 import platform
 import uuid
-import pathlib
 import asyncio
+import contextlib
 import traceback
 import importlib
 import logging
 import argparse
 import urllib3.util
+import orjson
+import msgspec
 import fastapi
 import pydantic
 
@@ -21,6 +22,9 @@ import flare_bypasser
 
 logger = logging.getLogger(__name__)
 
+# Strip '-script.pyw'/'.exe' suffix from sys.argv[0] before pass it to gunicorn/uvicorn.
+_ARGV0_CLEANUP_RE = re.compile(r'(-script\.pyw|\.exe)?$')
+
 USE_GUNICORN = (
   sys.platform not in ['win32', 'cygwin'] and 'FLARE_BYPASS_USE_UVICORN' not in os.environ
 )
@@ -30,6 +34,30 @@ if USE_GUNICORN:
 else:
   import uvicorn.main
 
+try:
+  import uvloop
+except ImportError:  # < uvloop isn't available on win32.
+  uvloop = None
+
+
+# Serialize responses with orjson and skip fastapi jsonable_encoder/revalidation pass.
+class ORJSONResponse(fastapi.Response):
+  media_type = "application/json"
+
+  def render(self, content) -> bytes:
+    return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+_msgspec_json_encoder = msgspec.json.Encoder(enc_hook=str)
+
+
+# Serialize msgspec.Struct response payloads (see response structs below).
+class MsgspecJSONResponse(fastapi.Response):
+  media_type = "application/json"
+
+  def render(self, content) -> bytes:
+    return _msgspec_json_encoder.encode(content)
+
 
 # Remove requirement for Content-Type header presence.
 class RemoveContentTypeRequirementMiddleware(object):
@@ -39,12 +67,10 @@ class RemoveContentTypeRequirementMiddleware(object):
   async def __call__(self, scope, receive, send):
     headers = scope["headers"]
     content_type_found = False
+    # ASGI guarantees lowercase bytes header names - compare bytes directly,
+    # without decode/lower allocations per header.
     for header_index, header in enumerate(headers):
-      if not isinstance(header, tuple) or len(header) != 2:
-        # Unexpected headers format - don't make something.
-        content_type_found = True
-        break
-      if header[0].decode('utf-8').lower() == 'content-type':
+      if header[0] == b'content-type':
         headers[header_index] = (b'content-type', b'application/json')
         content_type_found = True
         break
@@ -57,6 +83,7 @@ class RemoveContentTypeRequirementMiddleware(object):
 server = fastapi.FastAPI(
   openapi_url='/docs/openapi.json',
   docs_url='/docs',
+  default_response_class=ORJSONResponse,
   swagger_ui_parameters={"defaultModelsExpandDepth": -1},
   tags_metadata=[]
 )
@@ -80,7 +107,9 @@ solver_args = {
 
 
 request_processing_default_args = {
-  'forks': []
+  'forks': [],
+  # Flat list of start delays - precomputed once from 'forks' (one element per fork task).
+  'fork_schedule': []
 }
 
 
@@ -125,30 +154,59 @@ class HandleCommandResponse(pydantic.BaseModel):
   solution: typing.Optional[HandleCommandResponseSolution] = None
 
 
+# msgspec counterparts of the response models for the return path - pure data
+# carriers without validators, encoded much faster than pydantic models.
+# omit_defaults drops fields left at their None defaults (as exclude_none did).
+class CookieStruct(msgspec.Struct, omit_defaults=True):
+  name: str
+  value: str
+  domain: str
+  path: str
+  secure: bool
+  port: typing.Optional[int] = None
+  expires: typing.Optional[float] = None
+
+
+class HandleCommandResponseSolutionStruct(msgspec.Struct, omit_defaults=True):
+  status: int
+  url: str
+  # cookies is required (always filled on construction) - an empty list should
+  # stay on the wire, clients read solution['cookies'] unconditionally.
+  cookies: typing.List[CookieStruct]
+  userAgent: typing.Optional[str] = None
+  response: typing.Optional[typing.Any] = None
+
+
+class HandleCommandResponseStruct(msgspec.Struct, omit_defaults=True):
+  status: str
+  message: str
+  startTimestamp: float
+  endTimestamp: float
+  solution: typing.Optional[HandleCommandResponseSolutionStruct] = None
+
+
 async def wait_first_non_exception(tasks, return_condition = lambda x: True):
-  task_features = [asyncio.ensure_future(t()) for t in tasks]
-  to_cancel_tasks = []
+  task_futures = [asyncio.ensure_future(t()) for t in tasks]
   skipped_results = []
   exceptions = []
+  pending_count = len(task_futures)
   try:
-    while task_features:
-      finished, to_cancel_tasks = await asyncio.wait(task_features, return_when = asyncio.FIRST_COMPLETED)
-      for f in finished:
-        task_features.remove(f)
-      for f in finished:
-        try:
-          res = await f
-          if return_condition(res):
-            return (res, skipped_results, exceptions)
-          else:
-            skipped_results.append(res)
-        except Exception as e:
-          exceptions.append(e)
-          if not task_features:
-            raise e
+    for next_future in asyncio.as_completed(task_futures):
+      pending_count -= 1
+      try:
+        res = await next_future
+        if return_condition(res):
+          return (res, skipped_results, exceptions)
+        else:
+          skipped_results.append(res)
+      except Exception as e:
+        exceptions.append(e)
+        if not pending_count:
+          raise e
   finally:
-    for t in to_cancel_tasks:
-      t.cancel()
+    for t in task_futures:
+      if not t.done():
+        t.cancel()
   return (None, skipped_results, exceptions)
 
 
@@ -158,19 +216,59 @@ async def deffered_call(task, timeout: float):
   return await task()
 
 
+_SOLVER_POOL_MAX_SIZE = 8
+# Pool of reusable no-proxy Solver instances (created lazily inside the running loop).
+# Only the no-proxy case is pooled: proxy is a per request parameter, pooling by proxy
+# url would retain solvers for every proxy ever seen without eviction.
+_no_proxy_solver_pool = None
+
+
+@contextlib.asynccontextmanager
+async def pooled_solver(proxy = None, log_prefix = '', solver_args = None):
+  if solver_args is None:
+    solver_args = {}
+  pool = None
+  solver = None
+  # Don't pool solvers with per request debug dirs (unique directory by request).
+  if (
+    proxy is None and
+    not solver_args.get('debug_dir') and not solver_args.get('challenge_screenshots_dir')
+  ):
+    global _no_proxy_solver_pool
+    if _no_proxy_solver_pool is None:
+      _no_proxy_solver_pool = asyncio.LifoQueue(maxsize = _SOLVER_POOL_MAX_SIZE)
+    pool = _no_proxy_solver_pool
+    try:
+      solver = pool.get_nowait()
+      solver.reset(log_prefix=log_prefix)
+    except asyncio.QueueEmpty:
+      pass
+  if solver is None:
+    solver = flare_bypasser.Solver(
+      proxy=proxy,
+      log_prefix=log_prefix,
+      **solver_args)
+  try:
+    yield solver
+  finally:
+    if pool is not None:
+      try:
+        pool.put_nowait(solver)
+      except asyncio.QueueFull:
+        pass
+
+
 async def get_user_agent(
-  solver_args: dict = {},
+  solver_args: dict = None,  # < no mutable default - shared dict can be mutated by callee
   max_timeout: int = None  # < timeout in msec
 ) -> str:
   try:
     try:
-      return await asyncio.wait_for(
-        flare_bypasser.Solver(
-          log_prefix="fork user-agent",
-          **solver_args,
-        ).get_user_agent(),
-        max_timeout / 1000
-      )
+      async with pooled_solver(log_prefix="fork user-agent", solver_args=solver_args) as solver:
+        return await asyncio.wait_for(
+          solver.get_user_agent(),
+          max_timeout / 1000
+        )
     except asyncio.TimeoutError:
       raise Exception("Processing timeout (max_timeout=" + str(max_timeout) + ")")
   except Exception as e:
@@ -181,18 +279,15 @@ async def solve(
   solve_request: flare_bypasser.Request,
   proxy: str = None,
   log_prefix: str = '',
-  solver_args: dict = {}
+  solver_args: dict = None
 ):
-  logger.info(log_prefix + "Solve start")
+  logger.info("%sSolve start", log_prefix)
 
-  solver = flare_bypasser.Solver(
-    proxy=proxy,
-    log_prefix=log_prefix,
-    **solver_args)
-  return await solver.solve(
-    solve_request,
-    fill_user_agent=False,  # < user_agent will be filled in separate fork
-  )
+  async with pooled_solver(proxy=proxy, log_prefix=log_prefix, solver_args=solver_args) as solver:
+    return await solver.solve(
+      solve_request,
+      fill_user_agent=False,  # < user_agent will be filled in separate fork
+    )
 
 
 async def process_solve_request(
@@ -204,47 +299,56 @@ async def process_solve_request(
   params: dict = {},
   forks: typing.List[DefferedForksModel] = None  # < Forks for solve. Usable for sites with unstable loading.
 ):
-  start_timestamp = datetime.datetime.timestamp(datetime.datetime.now())
+  start_timestamp = time.time()
 
   # Adapt proxy format for canonical representation.
-  if proxy is not None and not isinstance(proxy, str):
-    if proxy.url is not None:
-      parsed_proxy = urllib3.util.parse_url(proxy.url)
-      proxy = (
-        parsed_proxy.scheme + "://" +
-        (
-          proxy.username + ":" + (proxy.password if proxy.password else '') + '@'
-          if proxy.username else ''
-        ) +
-        parsed_proxy.hostname +
-        (":" + str(parsed_proxy.port) if parsed_proxy.port else '')
-      )
-    else:
-      proxy = None
+  # Branches ordered by frequency: no proxy and plain string proxies pass through
+  # without any attribute lookups.
+  if proxy is None or isinstance(proxy, str):
+    pass
+  elif proxy.url is not None:
+    parse_url = urllib3.util.parse_url  # < bind locals, skip module attribute lookups
+    make_url = urllib3.util.Url
+    parsed_proxy = parse_url(proxy.url)
+    proxy = make_url(
+      scheme=parsed_proxy.scheme,
+      auth=(
+        proxy.username + ":" + (proxy.password if proxy.password else '')
+        if proxy.username else None
+      ),
+      host=parsed_proxy.hostname,
+      port=parsed_proxy.port
+    ).url
+  else:
+    proxy = None
 
   try:
     solve_request = flare_bypasser.Request()
     solve_request.cmd = cmd
     solve_request.url = url
-    solve_request.cookies = [
-      (cookie if isinstance(cookie, dict) else cookie.__dict__)
-      for cookie in cookies
-    ] if cookies else []
+    # Cookies arrive as an uniform list (dicts or CookieModel's) - branch on the
+    # first element once instead of isinstance check per cookie.
+    if not cookies:
+      solve_request.cookies = []
+    elif isinstance(cookies[0], dict):
+      solve_request.cookies = list(cookies)
+    else:
+      solve_request.cookies = [cookie.model_dump() for cookie in cookies]
     solve_request.max_timeout = max_timeout * 1.0 / 1000
     solve_request.proxy = proxy
     solve_request.params = params
 
-    local_solver_args = copy.copy(solver_args)
-
-    if local_solver_args['debug_dir']:
-      debug_dir = os.path.join(local_solver_args['debug_dir'], str(uuid.uuid4()))
-      pathlib.Path(debug_dir).mkdir(parents=True, exist_ok=True)
-      local_solver_args['debug_dir'] = debug_dir
+    local_solver_args = solver_args.copy()
 
-    if local_solver_args['challenge_screenshots_dir']:
-      debug_dir = os.path.join(local_solver_args['challenge_screenshots_dir'], str(uuid.uuid4()))
-      pathlib.Path(debug_dir).mkdir(parents=True, exist_ok=True)
-      local_solver_args['challenge_screenshots_dir'] = debug_dir
+    if local_solver_args['debug_dir'] or local_solver_args['challenge_screenshots_dir']:
+      # One uuid for both dirs - allows to correlate debug dumps with challenge screenshots.
+      request_id = uuid.uuid4().hex
+      for dir_key in ('debug_dir', 'challenge_screenshots_dir'):
+        base_dir = local_solver_args[dir_key]
+        if base_dir:
+          request_dir = os.path.join(base_dir, request_id)
+          os.makedirs(request_dir, exist_ok=True)
+          local_solver_args[dir_key] = request_dir
 
     cur_fork_i = 0
     solve_tasks = []
@@ -256,68 +360,98 @@ async def process_solve_request(
     )
     cur_fork_i += 1
 
-    if forks is None:
-      forks = request_processing_default_args['forks']
-
-    if forks:
-      for forks_model in forks:
-        for i in range(forks_model.forks):
-          solve_tasks.append(
-            lambda fork_i = cur_fork_i: deffered_call(
-              lambda: solve(
-                solve_request, proxy = proxy, solver_args = local_solver_args,
-                log_prefix=("fork #" + str(fork_i) + ", "),
-                fill_user_agent=False  # < Request user agent in separate task
-              ),
-              forks_model.delay
-            )
-          )
-          cur_fork_i += 1
-
-    logger.info('Start solve_tasks = ' + str(solve_tasks))
-    (solve_response, _skipped_results, _exceptions), user_agent = await asyncio.gather(
-      wait_first_non_exception(solve_tasks),
-      get_user_agent(solver_args = local_solver_args, max_timeout = max_timeout)
+    fork_schedule = (
+      request_processing_default_args['fork_schedule'] if forks is None
+      else build_fork_schedule(forks)
     )
+
+    for fork_delay in fork_schedule:
+      solve_tasks.append(
+        lambda fork_i = cur_fork_i, fork_delay = fork_delay: deffered_call(
+          lambda: solve(
+            solve_request, proxy = proxy, solver_args = local_solver_args,
+            log_prefix=("fork #" + str(fork_i) + ", ")
+          ),
+          fork_delay
+        )
+      )
+      cur_fork_i += 1
+
+    logger.info('Start %s solve tasks', len(solve_tasks))
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug('Start solve_tasks = %s', solve_tasks)
+    if hasattr(asyncio, 'TaskGroup'):  # python 3.11+
+      # TaskGroup cancels the sibling task when one side fails - don't leave
+      # solve forks (and their browsers) running after get_user_agent failed and vice versa.
+      try:
+        async with asyncio.TaskGroup() as task_group:
+          solve_task = task_group.create_task(wait_first_non_exception(solve_tasks))
+          user_agent_task = task_group.create_task(
+            get_user_agent(solver_args = local_solver_args, max_timeout = max_timeout))
+      except Exception as e:
+        # Unwrap ExceptionGroup raised by TaskGroup for keep original error message.
+        raise e.exceptions[0] if hasattr(e, 'exceptions') else e
+      (solve_response, _skipped_results, _exceptions) = solve_task.result()
+      user_agent = user_agent_task.result()
+    else:
+      solve_task = asyncio.ensure_future(wait_first_non_exception(solve_tasks))
+      user_agent_task = asyncio.ensure_future(
+        get_user_agent(solver_args = local_solver_args, max_timeout = max_timeout))
+      # Cancel the other side as soon as one fails - free its browsers immediately
+      # instead of waiting for it to finish on its own.
+      await asyncio.wait({solve_task, user_agent_task}, return_when = asyncio.FIRST_EXCEPTION)
+      for task in (solve_task, user_agent_task):
+        if not task.done():
+          task.cancel()
+      results = await asyncio.gather(solve_task, user_agent_task, return_exceptions = True)
+      for task_result in results:
+        if isinstance(task_result, Exception):
+          raise task_result
+      (solve_response, _skipped_results, _exceptions), user_agent = results
     # < solve_response can't be None if no return_condition passed to wait_first_non_exception,
     # only exception expected
     solve_response.user_agent = user_agent
 
-    return HandleCommandResponse(
-      status="ok",
-      message=solve_response.message,
-      startTimestamp=start_timestamp,
-      endTimestamp=datetime.datetime.timestamp(datetime.datetime.now()),
-      solution=HandleCommandResponseSolution(
-        status=200,
-        url=solve_response.url,
-        cookies=[  # Convert cookiejar.Cookie to CookieModel
-          CookieModel(**cookie) for cookie in solve_response.cookies
-        ],
-        # < pass cookies as dict's (solver don't know about rest model).
-        userAgent=solve_response.user_agent,
+    # Construct response structs without validation - data here is produced by us.
+    return MsgspecJSONResponse(
+      HandleCommandResponseStruct(
+        status="ok",
         message=solve_response.message,
-        response=solve_response.response
+        startTimestamp=start_timestamp,
+        endTimestamp=time.time(),
+        solution=HandleCommandResponseSolutionStruct(
+          status=200,
+          url=solve_response.url,
+          cookies=[  # Convert cookiejar.Cookie to CookieStruct
+            CookieStruct(**cookie) for cookie in solve_response.cookies
+          ],
+          # < pass cookies as dict's (solver don't know about rest model).
+          userAgent=solve_response.user_agent,
+          response=solve_response.response
+        )
       )
     )
 
   except Exception as e:
     print(str(e))
     print(traceback.format_exc(), flush=True)
-    return HandleCommandResponse(
-      status="error",
-      message="Error: " + str(e),
-      startTimestamp=start_timestamp,
-      endTimestamp=datetime.datetime.timestamp(datetime.datetime.now()),
+    return MsgspecJSONResponse(
+      HandleCommandResponseStruct(
+        status="error",
+        message="Error: " + str(e),
+        startTimestamp=start_timestamp,
+        endTimestamp=time.time()
+      )
     )
 
 
 # Endpoint compatible with flaresolverr API.
 @server.post(
   "/v1",
-  response_model=HandleCommandResponse,
-  tags=['FlareSolverr compatiblity API'],
-  response_model_exclude_none=True
+  # Handlers return an already serialized ORJSONResponse - disable fastapi
+  # outgoing response validation.
+  response_model=None,
+  tags=['FlareSolverr compatiblity API']
 )
 async def Process_request_in_flaresolverr_format(
   url: typing_extensions.Annotated[
@@ -361,8 +495,7 @@ async def Process_request_in_flaresolverr_format(
 
 # REST API concept methods.
 @server.post(
-  "/get_cookies", response_model=HandleCommandResponse, tags=['Standard API'],
-  response_model_exclude_none=True
+  "/get_cookies", response_model=None, tags=['Standard API']
 )
 async def Get_cookies_after_solve(
   url: typing_extensions.Annotated[
@@ -398,8 +531,7 @@ async def Get_cookies_after_solve(
 
 
 @server.post(
-  "/get_page", response_model=HandleCommandResponse, tags=['Standard API'],
-  response_model_exclude_none=True
+  "/get_page", response_model=None, tags=['Standard API']
 )
 async def Get_cookies_and_page_content_after_solve(
   url: typing_extensions.Annotated[
@@ -435,8 +567,7 @@ async def Get_cookies_and_page_content_after_solve(
 
 
 @server.post(
-  "/make_post", response_model=HandleCommandResponse, tags=['Standard API'],
-  response_model_exclude_none=True
+  "/make_post", response_model=None, tags=['Standard API']
 )
 async def Get_cookies_and_POST_request_result(
   url: typing_extensions.Annotated[
@@ -483,8 +614,7 @@ async def Get_cookies_and_POST_request_result(
 
 
 @server.post(
-  "/command/{command}", response_model=HandleCommandResponse, tags=['Standard API'],
-  response_model_exclude_none=True
+  "/command/{command}", response_model=None, tags=['Standard API']
 )
 async def Process_user_custom_command(
   command: typing_extensions.Annotated[
@@ -563,6 +693,10 @@ def parse_entrypoint_command_processors(extension: str):
   return result_command_processors
 
 
+def build_fork_schedule(forks: typing.List[DefferedForksModel]):
+  return [forks_model.delay for forks_model in forks for _ in range(forks_model.forks)]
+
+
 def parse_solve_forks(solve_forks: str):
   res = []
   forks_arr = solve_forks.strip(' "').split(',')
@@ -660,9 +794,9 @@ def server_run():
 
     parser = init_args_parser()
     args, unknown_args = parser.parse_known_args()
-    try:
-      host, port = args.bind.split(':')
-    except Exception:
+    # rpartition: split on the last ':' - keeps IPv6 literals in the host part intact.
+    host, _, port = args.bind.rpartition(':')
+    if not host or not port:
       print("Invalid 'bind' argument value: " + str(args.bind), file=sys.stderr, flush=True)
       sys.exit(1)
 
@@ -676,13 +810,15 @@ def server_run():
 
     if args.forks:
       request_processing_default_args['forks'] = parse_solve_forks(args.forks)
+      request_processing_default_args['fork_schedule'] = build_fork_schedule(
+        request_processing_default_args['forks'])
 
     if args.debug_dir:
       logging.getLogger('flare_bypasser.flare_bypasser').setLevel(logging.DEBUG)
     solver_args['debug_dir'] = args.debug_dir
     solver_args['challenge_screenshots_dir'] = args.challenge_screenshots_dir
 
-    sys.argv = [re.sub(r'(-script\.pyw|\.exe)?$', '', sys.argv[0])]
+    sys.argv = [_ARGV0_CLEANUP_RE.sub('', sys.argv[0])]
     sys.argv += unknown_args
 
     # Init ProxyController
@@ -694,6 +830,12 @@ def server_run():
     if args.disable_gpu:
       solver_args['disable_gpu'] = True
 
+    if uvloop is not None:
+      # Use libuv based event loop - it lowers loop overhead for asyncio.wait/gather
+      # heavy request processing.
+      uvloop.install()
+      os.environ.setdefault('UVICORN_LOOP', 'uvloop')
+
     if USE_GUNICORN:
       sys.argv += ['-b', args.bind]
       sys.argv += ['--worker-class', 'uvicorn.workers.UvicornWorker']
@@ -702,6 +844,8 @@ def server_run():
     else:
       sys.argv += ['--host', host]
       sys.argv += ['--port', port]
+      if uvloop is not None:
+        sys.argv += ['--loop', 'uvloop']
       sys.argv += ['flare_bypasser:server']
       sys.exit(uvicorn.main.main())
 
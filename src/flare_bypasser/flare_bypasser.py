@@ -212,6 +212,13 @@ class Solver(object):
     self._headless = headless
     self._log_prefix = log_prefix
 
+  # Drop per request state - allow to reuse instance from pool (see flare_bypass_server).
+  def reset(self, proxy: str = None, log_prefix: str = ''):
+    self._proxy = proxy
+    self._log_prefix = log_prefix
+    self._driver = None
+    self._screenshot_i = 0
+
   @staticmethod
   def title_is_denied_title(page_title):
     page_title = page_title.lower()